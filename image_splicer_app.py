@@ -3,6 +3,11 @@ from tkinter import filedialog, ttk, messagebox
 from PIL import Image, ImageTk, ImageGrab, ImageDraw, ImageFont # Added ImageDraw, ImageFont
 import os # 用于检查文件路径
 import tempfile # Added tempfile
+import hashlib # 图集去重
+import json # 图集元数据
+import queue # 后台预览线程与Tk主线程之间传递结果
+import threading
+import time
 try:
     from tkinterdnd2 import DND_FILES, TkinterDnD
 except ImportError:
@@ -11,7 +16,90 @@ except ImportError:
     messagebox.showwarning("警告", "tkinterdnd2 模块未找到。\n拖拽功能将不可用。\n请运行: pip install tkinterdnd2")
 
 
+class ImageLoadError(Exception):
+    """An image in the list could not be opened or decoded; path names the file."""
+
+    def __init__(self, path, error):
+        super().__init__(f"{os.path.basename(path)}: {error}")
+        self.path = path
+
+
+class SkylinePacker:
+    """Bottom-left skyline rectangle packer for one atlas page.
+
+    The skyline is a list of [x, y, width] segments covering the page width from left
+    to right. Each rectangle goes where its top edge ends up lowest, so the cost per
+    insert only depends on the number of segments, not on how many sprites are placed.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.skyline = [[0, 0, width]]
+
+    def _fit(self, index, w, h):
+        """Returns the y at which a w*h rectangle fits with its left edge on segment index, or None."""
+        x = self.skyline[index][0]
+        if x + w > self.width:
+            return None
+        y = 0
+        remaining = w
+        i = index
+        while remaining > 0:
+            segment = self.skyline[i]
+            y = max(y, segment[1])
+            if y + h > self.height:
+                return None
+            remaining -= segment[2]
+            i += 1
+        return y
+
+    def insert(self, w, h):
+        """Places a w*h rectangle and returns its (x, y), or None if the page is full."""
+        best_top, best_index, best_y = None, None, None
+        for index in range(len(self.skyline)):
+            y = self._fit(index, w, h)
+            if y is not None and (best_top is None or y + h < best_top):
+                best_top, best_index, best_y = y + h, index, y
+        if best_index is None:
+            return None
+
+        x = self.skyline[best_index][0]
+        self.skyline.insert(best_index, [x, best_top, w])
+
+        # Shrink or drop the segments now covered by the new one
+        i = best_index + 1
+        while i < len(self.skyline):
+            previous, segment = self.skyline[i - 1], self.skyline[i]
+            overlap = previous[0] + previous[2] - segment[0]
+            if overlap <= 0:
+                break
+            segment[0] += overlap
+            segment[2] -= overlap
+            if segment[2] > 0:
+                break
+            del self.skyline[i]
+
+        # Merge neighbours at the same height
+        i = 0
+        while i < len(self.skyline) - 1:
+            if self.skyline[i][1] == self.skyline[i + 1][1]:
+                self.skyline[i][2] += self.skyline[i + 1][2]
+                del self.skyline[i + 1]
+            else:
+                i += 1
+        return x, best_y
+
+
 class ImageSplicerApp:
+    PREVIEW_POLL_INTERVAL_MS = 30 # 主线程轮询后台预览结果的间隔
+    COARSE_PREVIEW_PUSH_INTERVAL = 0.1 # 粗略预览逐步刷新的间隔(秒)
+    WATCH_POLL_INTERVAL_MS = 1000 # 监视文件夹的轮询间隔
+    WATCH_DEBOUNCE_MS = 1500 # 一批新文件到达后，安静这么久才重新拼接
+    WATCH_MAX_DELAY_MS = 10000 # 文件持续到达时，最早的新文件最多等待这么久就会被拼接
+    VALID_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp')
+    ATLAS_PADDING = 1 # 图集中精灵之间的间距(像素)，避免采样时相互渗色
+
     def __init__(self, root_tk_or_dnd): # root can be tk.Tk or TkinterDnD.Tk
         self.root = root_tk_or_dnd
         self.root.title("图片拼接工具")
@@ -20,6 +108,20 @@ class ImageSplicerApp:
         self.image_paths = []
         self.processed_image = None # 用于存储拼接后的Pillow Image对象
         self.processed_image_tk = None # 用于在Tkinter中显示的ImageTk.PhotoImage对象
+        self._splice_cancel_event = None # 当前后台预览/拼接任务的取消标志
+        self._atlas_cancel_event = None # 当前图集导出任务的取消标志，只有新的导出会取消它
+        self._splice_generation = 0 # 每开始一次拼接/追加就加一；图集导出据此判断预览是否已被更新
+        self._splice_state = None # 最近一次拼接结果的布局信息，用于增量追加
+
+        # 监视文件夹状态
+        self.watch_folder = None
+        self._watch_seen = set()    # 已加入列表(或已忽略)的文件
+        self._watch_pending = {}    # path -> (size, mtime_ns)，等待写入完成的文件
+        self._watch_ready = []      # 已写入完成、等待防抖结束后加入的文件
+        self._watch_failed = {}     # path -> (size, mtime_ns)，无法读取的文件，内容改变前不再尝试
+        self._watch_poll_job = None
+        self._watch_debounce_job = None
+        self._watch_first_arrival = None # 当前批次最早到达的时间(time.monotonic)，限制防抖的最长等待
 
         # --- 左侧：图片列表和控制 ---
         left_frame = ttk.Frame(root, padding="10")
@@ -63,6 +165,8 @@ class ImageSplicerApp:
         self.combo_splice_mode = ttk.Combobox(left_frame, textvariable=self.splice_mode_var,
                                               values=["横向拼接", "纵向拼接", "2xN网格"], state="readonly")
         self.combo_splice_mode.grid(row=4, column=0, columnspan=2, sticky="ew", pady=(0,10))
+        # 切换模式时取消正在进行的后台预览细化
+        self.combo_splice_mode.bind('<<ComboboxSelected>>', lambda event: self._cancel_preview_refinement())
 
         # 水印开关和颜色选择
         watermark_frame = ttk.Frame(left_frame)
@@ -79,14 +183,49 @@ class ImageSplicerApp:
         ttk.Label(watermark_frame, text="(左上角)").pack(side=tk.LEFT, padx=(2,0))
 
 
+        # 监视文件夹：新图片到达后自动追加并拼接
+        watch_frame = ttk.Frame(left_frame)
+        watch_frame.grid(row=6, column=0, columnspan=2, sticky="ew", pady=(5,0))
+
+        self.btn_watch = ttk.Button(watch_frame, text="监视文件夹", command=self.toggle_watch_folder)
+        self.btn_watch.pack(side=tk.LEFT)
+
+        self.watch_status_var = tk.StringVar(value="")
+        ttk.Label(watch_frame, textvariable=self.watch_status_var).pack(side=tk.LEFT, padx=(5,0))
+
+
+        # 图集(精灵表)导出
+        atlas_frame = ttk.Frame(left_frame)
+        atlas_frame.grid(row=7, column=0, columnspan=2, sticky="ew", pady=(5,0))
+
+        atlas_row1 = ttk.Frame(atlas_frame)
+        atlas_row1.pack(side=tk.TOP, fill=tk.X)
+        ttk.Label(atlas_row1, text="图集最大尺寸:").pack(side=tk.LEFT)
+        self.atlas_max_size_var = tk.StringVar(value="2048")
+        self.combo_atlas_max_size = ttk.Combobox(atlas_row1, textvariable=self.atlas_max_size_var,
+                                                 values=["512", "1024", "2048", "4096", "8192"], state="readonly", width=5)
+        self.combo_atlas_max_size.pack(side=tk.LEFT, padx=(5,0))
+        self.btn_export_atlas = ttk.Button(atlas_row1, text="导出图集", command=self.export_atlas)
+        self.btn_export_atlas.pack(side=tk.LEFT, padx=5)
+
+        atlas_row2 = ttk.Frame(atlas_frame)
+        atlas_row2.pack(side=tk.TOP, fill=tk.X)
+        self.atlas_trim_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(atlas_row2, text="裁剪透明边", variable=self.atlas_trim_var).pack(side=tk.LEFT)
+        self.atlas_dedup_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(atlas_row2, text="去重", variable=self.atlas_dedup_var).pack(side=tk.LEFT, padx=(5,0))
+        self.atlas_pot_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(atlas_row2, text="2的幂尺寸", variable=self.atlas_pot_var).pack(side=tk.LEFT, padx=(5,0))
+
+
         # 开始拼接按钮
         self.btn_splice = ttk.Button(left_frame, text="开始拼接", command=self.splice_images)
-        self.btn_splice.grid(row=6, column=0, columnspan=2, pady=10, sticky="ew")
+        self.btn_splice.grid(row=8, column=0, columnspan=2, pady=10, sticky="ew")
 
         # 左侧选中图片缩略图预览
-        ttk.Label(left_frame, text="选中项预览:").grid(row=7, column=0, columnspan=2, sticky="w", pady=(10, 5))
+        ttk.Label(left_frame, text="选中项预览:").grid(row=9, column=0, columnspan=2, sticky="w", pady=(10, 5))
         self.thumbnail_canvas = tk.Canvas(left_frame, bg="lightgrey", width=150, height=150) # 缩略图区域大小
-        self.thumbnail_canvas.grid(row=8, column=0, columnspan=2, pady=(0,10), sticky="ew")
+        self.thumbnail_canvas.grid(row=10, column=0, columnspan=2, pady=(0,10), sticky="ew")
         self.thumbnail_tk = None # To hold the PhotoImage for the thumbnail
 
         # 绑定列表框选择事件
@@ -126,13 +265,13 @@ class ImageSplicerApp:
     def _add_single_image_path(self, file_path):
         """Helper function to add a single valid image path to the list."""
         # Basic validation for file extension (can be expanded)
-        valid_extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp')
-        if not os.path.isfile(file_path) or not file_path.lower().endswith(valid_extensions):
+        if not os.path.isfile(file_path) or not file_path.lower().endswith(self.VALID_IMAGE_EXTENSIONS):
             # Optionally show a warning for invalid files, or silently ignore
             # messagebox.showwarning("无效文件", f"文件 '{file_path.split('/')[-1]}' 不是支持的图片格式或不存在。")
             return False
 
         if file_path not in self.image_paths:
+            self._cancel_preview_refinement() # List changed, the running refinement is stale
             self.image_paths.append(file_path)
             self.listbox_images.insert(tk.END, os.path.basename(file_path))
             return True
@@ -308,14 +447,17 @@ class ImageSplicerApp:
             messagebox.showwarning("提示", "请先选择要移除的图片。")
             return
 
+        self._cancel_preview_refinement()
         for i in sorted(selected_indices, reverse=True):
             self.listbox_images.delete(i)
             del self.image_paths[i]
 
     def clear_images(self):
+        self._cancel_preview_refinement()
         self.listbox_images.delete(0, tk.END)
         self.image_paths.clear()
         self.processed_image = None
+        self._splice_state = None
         self.processed_image_tk = None
         self.preview_canvas.delete("all")
         self.thumbnail_canvas.delete("all") # 清空缩略图
@@ -323,6 +465,125 @@ class ImageSplicerApp:
         self.btn_copy.config(state=tk.DISABLED)
         self.btn_save.config(state=tk.DISABLED)
 
+    def toggle_watch_folder(self):
+        if self.watch_folder:
+            self.stop_watch_folder()
+            return
+
+        folder = filedialog.askdirectory(title="选择要监视的文件夹")
+        if folder:
+            self.start_watch_folder(folder)
+
+    def _scan_watch_folder(self):
+        """Returns {path: (size, mtime_ns)} for the image files currently in the watched folder."""
+        found = {}
+        try:
+            with os.scandir(self.watch_folder) as entries:
+                for entry in entries:
+                    if not entry.name.lower().endswith(self.VALID_IMAGE_EXTENSIONS):
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        st = entry.stat()
+                    except OSError:
+                        continue # Deleted or renamed since scandir listed it
+                    found[entry.path] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            pass # Folder temporarily unavailable, try again on the next poll
+        return found
+
+    def start_watch_folder(self, folder):
+        self.stop_watch_folder()
+        self.watch_folder = folder
+        self.btn_watch.config(text="停止监视")
+        self._set_watch_status()
+
+        # Images already in the folder form the start of the sheet (oldest first, see
+        # _flush_watch_arrivals). They go through the same two-poll stability check as
+        # later arrivals, so a file still being written right now is not opened half-finished.
+        self._watch_pending = self._scan_watch_folder()
+
+        self._watch_poll_job = self.root.after(self.WATCH_POLL_INTERVAL_MS, self._poll_watch_folder)
+
+    def stop_watch_folder(self):
+        for job in (self._watch_poll_job, self._watch_debounce_job):
+            if job is not None:
+                self.root.after_cancel(job)
+        self._watch_poll_job = None
+        self._watch_debounce_job = None
+        self.watch_folder = None
+        self._watch_seen = set()
+        self._watch_pending = {}
+        self._watch_ready = []
+        self._watch_first_arrival = None
+        self._watch_failed = {}
+        self.btn_watch.config(text="监视文件夹")
+        self.watch_status_var.set("")
+
+    def _set_watch_status(self, note=""):
+        folder_name = os.path.basename(os.path.normpath(self.watch_folder)) or self.watch_folder
+        self.watch_status_var.set(f"{folder_name} ({note})" if note else folder_name)
+
+    def _poll_watch_folder(self):
+        current = self._scan_watch_folder()
+        arrived = False
+        for path, signature in current.items():
+            if path in self._watch_seen or self._watch_failed.get(path) == signature:
+                continue # Already added, or unreadable and unchanged since
+            # A file counts as arrived once its size and mtime stop changing between two polls,
+            # so images that are still being written are not opened half-finished.
+            if self._watch_pending.get(path) == signature and signature[0] > 0:
+                del self._watch_pending[path]
+                self._watch_failed.pop(path, None)
+                self._watch_seen.add(path)
+                self._watch_ready.append((signature[1], path))
+                arrived = True
+            else:
+                self._watch_pending[path] = signature
+        for path in list(self._watch_pending):
+            if path not in current: # Deleted or renamed before it finished
+                del self._watch_pending[path]
+
+        if arrived: # Debounce: restart the quiet period on every new arrival
+            self._schedule_watch_flush()
+
+        self._watch_poll_job = self.root.after(self.WATCH_POLL_INTERVAL_MS, self._poll_watch_folder)
+
+    def _schedule_watch_flush(self):
+        """(Re)starts the debounce, capped at WATCH_MAX_DELAY_MS after the first queued arrival.
+
+        A burst is still grouped, but a folder that receives files continuously gets
+        re-spliced at a bounded interval instead of never.
+        """
+        now = time.monotonic()
+        if self._watch_first_arrival is None:
+            self._watch_first_arrival = now
+        deadline_ms = (self._watch_first_arrival - now) * 1000 + self.WATCH_MAX_DELAY_MS
+        delay_ms = max(0, int(min(self.WATCH_DEBOUNCE_MS, deadline_ms)))
+
+        if self._watch_debounce_job is not None:
+            self.root.after_cancel(self._watch_debounce_job)
+        self._watch_debounce_job = self.root.after(delay_ms, self._flush_watch_arrivals)
+
+    def _flush_watch_arrivals(self):
+        self._watch_debounce_job = None
+        if self._splice_cancel_event is not None:
+            # Adding paths now would cancel the running splice and restart it from scratch.
+            # Keep the arrivals queued; _poll_splice_results flushes them once it finishes,
+            # so they can extend its result.
+            return
+        ready = sorted(self._watch_ready)
+        self._watch_ready = []
+        self._watch_first_arrival = None
+
+        added_count = 0
+        for _, path in ready:
+            if self._add_single_image_path(path):
+                added_count += 1
+        if added_count:
+            self._splice_appended_images()
+
     def update_thumbnail_preview(self, event=None):
         self.thumbnail_canvas.delete("all")
         self.thumbnail_tk = None
@@ -369,10 +630,7 @@ class ImageSplicerApp:
             pass
 
 
-    def update_preview(self, pil_image):
-        self.processed_image = pil_image
-        self.preview_canvas.delete("all")
-        
+    def _get_preview_canvas_size(self):
         canvas_width = self.preview_canvas.winfo_width()
         canvas_height = self.preview_canvas.winfo_height()
 
@@ -381,12 +639,16 @@ class ImageSplicerApp:
             canvas_height = self.preview_canvas.cget("height") # Fallback to configured height
             if isinstance(canvas_width, str): canvas_width = int(canvas_width)
             if isinstance(canvas_height, str): canvas_height = int(canvas_height)
+        return canvas_width, canvas_height
 
+    def _fit_image_to_canvas(self, pil_image, canvas_width, canvas_height):
+        """Returns a copy of pil_image shrunk (never enlarged) to fit the canvas.
 
-        img_copy = pil_image.copy()
-        img_width, img_height = img_copy.size
+        Does not touch any Tk widget, so it is safe to call from the background worker.
+        """
+        img_width, img_height = pil_image.size
         
-        if img_width == 0 or img_height == 0: return # Avoid division by zero
+        if img_width == 0 or img_height == 0: return None # Avoid division by zero
 
         ratio = min(canvas_width / img_width, canvas_height / img_height)
         
@@ -394,13 +656,35 @@ class ImageSplicerApp:
             new_width = int(img_width * ratio)
             new_height = int(img_height * ratio)
             if new_width > 0 and new_height > 0:
-                 img_copy = img_copy.resize((new_width, new_height), Image.Resampling.LANCZOS)
+                 return pil_image.resize((new_width, new_height), Image.Resampling.LANCZOS) # Already a new image
+        return pil_image.copy()
+
+    def _draw_preview(self, preview_image):
+        """Draws an already canvas-sized image centered on the preview canvas."""
+        self.preview_canvas.delete("all")
+        canvas_width, canvas_height = self._get_preview_canvas_size()
 
-        self.processed_image_tk = ImageTk.PhotoImage(img_copy)
+        self.processed_image_tk = ImageTk.PhotoImage(preview_image)
         
-        x = (canvas_width - img_copy.width) / 2
-        y = (canvas_height - img_copy.height) / 2
+        x = (canvas_width - preview_image.width) / 2
+        y = (canvas_height - preview_image.height) / 2
         self.preview_canvas.create_image(x, y, anchor=tk.NW, image=self.processed_image_tk)
+
+    def update_preview(self, pil_image, preview_image=None):
+        """Makes pil_image the current result and shows it.
+
+        preview_image is an already canvas-sized copy (e.g. from the background worker);
+        without it the image is shrunk here.
+        """
+        self.processed_image = pil_image
+        self.preview_canvas.delete("all")
+        
+        if preview_image is None:
+            canvas_width, canvas_height = self._get_preview_canvas_size()
+            preview_image = self._fit_image_to_canvas(pil_image, canvas_width, canvas_height)
+        if preview_image is None: return
+
+        self._draw_preview(preview_image)
         
         self.btn_copy.config(state=tk.NORMAL)
         self.btn_save.config(state=tk.NORMAL)
@@ -416,208 +700,762 @@ class ImageSplicerApp:
             # Convert to RGBA. Opaque pixels get alpha=255.
             return image_object.convert('RGBA')
 
+    def _read_image_sizes(self, paths):
+        """Reads only the image headers, which is cheap even for large files."""
+        sizes = []
+        for p in paths:
+            try:
+                with Image.open(p) as img:
+                    sizes.append(img.size)
+            except Exception as e:
+                raise ImageLoadError(p, e) from e
+        return sizes
+
+    def _load_images_for_splice(self, paths, cancel_event=None, on_loaded=None):
+        """Opens the images and converts them to RGBA. Returns None if cancelled.
+
+        on_loaded(index, image) is called as each image becomes available.
+        """
+        images_to_splice_orig = [] # To store original Pillow image objects for closing
+        images_to_splice = []      # To store RGBA prepared Pillow image objects
+
+        try:
+            for p in paths:
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                try:
+                    img_orig = Image.open(p)
+                    images_to_splice_orig.append(img_orig) # Keep original for closing
+                    images_to_splice.append(self._prepare_image_for_paste(img_orig))
+                except Exception as e:
+                    raise ImageLoadError(p, e) from e
+                if on_loaded is not None:
+                    on_loaded(len(images_to_splice) - 1, images_to_splice[-1])
+        finally:
+            # Always close original Pillow image objects after they've been processed or if an error occurs
+            for img_obj in images_to_splice_orig:
+                img_obj.close()
+        return images_to_splice
+
+    def _apply_watermarks(self, images, color_name, start_index=1):
+        """Returns copies of the RGBA images with a "图N" index drawn in the top-left corner.
+
+        start_index is the number of the first image, so appended images continue the sequence.
+        """
+        images_with_watermark = []
+        font = None
+        font_size = 20
+        try:
+            # Try to load a common font, adjust path if necessary or use default
+            # For simplicity, let's try a very basic font loading.
+            # A more robust solution would bundle a font or use a font finding mechanism.
+            font_path_msyh = "msyh.ttf" # Assuming "微软雅黑.ttf" is named this and in the same directory
+            font_path_simsun = "simsun.ttc" #宋体, common on Windows
+            font_path_arial = "arial.ttf"
+            font_path_dejavu = "DejaVuSans.ttf"
+
+            font_load_attempts = [font_path_msyh, font_path_simsun, font_path_arial, font_path_dejavu]
+            
+            for font_path_attempt in font_load_attempts:
+                try:
+                    font = ImageFont.truetype(font_path_attempt, font_size)
+                    break # Font loaded successfully
+                except IOError:
+                    font = None # Continue to next attempt
+            
+            if not font:
+                font = ImageFont.load_default() # Fallback to Pillow's default bitmap font
+                # Default font is small, consider adjusting text_position or font_size if this is often hit
+                # For now, we'll use it as is.
+        except Exception as e:
+            # print(f"General font loading error: {e}")
+            font = ImageFont.load_default() # Ultimate fallback
+
+        for i, img_rgba in enumerate(images):
+            img_copy = img_rgba.copy() # Work on a copy
+            draw = ImageDraw.Draw(img_copy)
+            text = f"图{start_index + i}"
+            
+            text_position = (10, 10)
+            selected_text_color_name = color_name
+            
+            if selected_text_color_name == "白色":
+                text_color = (255, 255, 255, 255) # White
+                shadow_color = (0, 0, 0, 128)     # Black shadow
+            elif selected_text_color_name == "黑色":
+                text_color = (0, 0, 0, 255)       # Black
+                shadow_color = (255, 255, 255, 128) # White shadow
+            else: # Default to Red
+                text_color = (255, 0, 0, 255)     # Red
+                shadow_color = (0, 0, 0, 128)     # Black shadow
+
+            shadow_offset = 1
+            # Draw shadow first
+            draw.text((text_position[0]+shadow_offset, text_position[1]+shadow_offset), text, font=font, fill=shadow_color)
+            # Draw main text
+            draw.text(text_position, text, font=font, fill=text_color)
+            
+            images_with_watermark.append(img_copy)
+        return images_with_watermark
+
     def splice_images(self):
         if not self.image_paths:
             messagebox.showwarning("提示", "请先添加图片。")
             return
 
-        images_to_splice_orig = [] # To store original Pillow image objects for closing
-        images_to_splice = []      # To store RGBA prepared Pillow image objects
+        mode = self.splice_mode_var.get()
+        if mode not in ("横向拼接", "纵向拼接", "2xN网格"):
+            messagebox.showerror("错误", "未知的拼接模式。")
+            return
+
+        # A new splice supersedes whatever is still being refined
+        self._cancel_preview_refinement()
+        paths = list(self.image_paths)
 
         try:
-            for p in self.image_paths:
-                img_orig = Image.open(p)
-                images_to_splice_orig.append(img_orig) # Keep original for closing
-                images_to_splice.append(self._prepare_image_for_paste(img_orig))
+            sizes = self._read_image_sizes(paths)
+        except ImageLoadError as e:
+            self._handle_image_load_error(f"打开或预处理图片失败: {e}", e.path)
+            return
 
-        except Exception as e:
-            messagebox.showerror("错误", f"打开或预处理图片失败: {e}")
-            # Close any successfully opened images if error occurs mid-list
-            for img_obj in images_to_splice_orig: # Close the opened original images
-                img_obj.close()
+        # 1. Show the layout right away: placeholder boxes at canvas resolution,
+        #    computed from the image headers only.
+        layout = self._compute_layout(mode, sizes)
+        canvas_width, canvas_height = self._get_preview_canvas_size()
+        watermark_color = self.watermark_color_var.get() if self.watermark_var.get() else None
+        coarse_image, boxes = self._build_layout_placeholder(layout, sizes, canvas_width, canvas_height)
+
+        self.processed_image = None
+        self._splice_state = None
+        self.btn_copy.config(state=tk.DISABLED)
+        self.btn_save.config(state=tk.DISABLED)
+        self._draw_preview(coarse_image)
+
+        # 2. Fill in reduced-resolution decodes, then the full composite, in the background.
+        #    Tk variables are read above because the worker must not touch widgets.
+        splice_state = {"paths": paths, "mode": mode, "watermark_color": watermark_color,
+                        "sizes": sizes, "size": layout[0], "positions": layout[1]}
+        cancel_event = threading.Event()
+        result_queue = queue.Queue()
+        self._splice_cancel_event = cancel_event
+        self._splice_generation += 1
+
+        worker = threading.Thread(
+            target=self._run_worker,
+            args=(result_queue, self._refine_preview_worker,
+                  paths, mode, watermark_color, coarse_image, boxes, splice_state,
+                  canvas_width, canvas_height, cancel_event, result_queue),
+            daemon=True
+        )
+        worker.start()
+        self.root.after(self.PREVIEW_POLL_INTERVAL_MS, self._poll_splice_results, cancel_event, result_queue)
+
+    def _splice_appended_images(self):
+        """Re-splices after images were appended to the end of the list.
+
+        If the previous result used the same mode/watermark and appending does not move
+        any already placed image (e.g. equal-width vertical strips, or any 2xN grid),
+        the existing composite is extended and only the new images are decoded.
+        Otherwise this falls back to a full splice_images().
+        """
+        state = self._splice_state
+        mode = self.splice_mode_var.get()
+        watermark_color = self.watermark_color_var.get() if self.watermark_var.get() else None
+        n_old = len(state["paths"]) if state else 0
+
+        if (not state or state["mode"] != mode
+                or state["watermark_color"] != watermark_color
+                or len(self.image_paths) <= n_old or self.image_paths[:n_old] != state["paths"]):
+            self.splice_images()
+            return
+        if mode == "2xN网格" and n_old == 1:
+            self.splice_images() # A single-image grid is the image itself, not a composite
+            return
+
+        paths = list(self.image_paths)
+        try:
+            new_sizes = self._read_image_sizes(paths[n_old:])
+        except ImageLoadError as e:
+            self._handle_image_load_error(f"打开或预处理图片失败: {e}", e.path)
             return
+
+        sizes = state["sizes"] + new_sizes
+        (total_size, positions) = self._compute_layout(mode, sizes)
+        if positions[:n_old] != state["positions"]:
+            self.splice_images() # Earlier images would move, so the old composite is not reusable
+            return
+
+        self._cancel_preview_refinement()
+        new_state = {"paths": paths, "mode": mode, "watermark_color": watermark_color,
+                     "sizes": sizes, "size": total_size, "positions": positions}
+        canvas_width, canvas_height = self._get_preview_canvas_size()
+        cancel_event = threading.Event()
+        result_queue = queue.Queue()
+        self._splice_cancel_event = cancel_event
+        self._splice_generation += 1
+
+        worker = threading.Thread(
+            target=self._run_worker,
+            args=(result_queue, self._extend_splice_worker,
+                  state, paths[n_old:], new_state,
+                  canvas_width, canvas_height, cancel_event, result_queue),
+            daemon=True
+        )
+        worker.start()
+        self.root.after(self.PREVIEW_POLL_INTERVAL_MS, self._poll_splice_results, cancel_event, result_queue)
+
+    def _handle_image_load_error(self, message, path):
+        """Reports an unreadable image.
+
+        In watch mode a file that came from the watched folder is dropped from the
+        list and noted in the status label instead of a dialog, so an unattended
+        sheet keeps updating. It is retried only if the file changes again.
+        """
+        if not (self.watch_folder and path in self._watch_seen and path in self.image_paths):
+            messagebox.showerror("错误", message)
+            return
+
+        index = self.image_paths.index(path)
+        del self.image_paths[index]
+        self.listbox_images.delete(index)
+        self._watch_seen.discard(path)
+        try:
+            st = os.stat(path)
+            self._watch_failed[path] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            pass # Gone already, nothing to remember
+        self._set_watch_status(f"已跳过无法读取的文件: {os.path.basename(path)}")
+
+        state = self._splice_state
+        if state and self.image_paths == state["paths"]:
+            return # Only the bad file was new, the current result is still complete
+        if self.image_paths:
+            self._splice_appended_images()
+
+    def _run_worker(self, result_queue, worker, *args):
+        """Thread target that always ends with a terminal message.
+
+        This way the poll loop stops even if the worker returns early or raises.
+        """
+        try:
+            worker(*args)
+        except Exception as e:
+            result_queue.put(("error", f"后台处理失败: {e}"))
         finally:
-            # Always close original Pillow image objects after they've been processed or if an error occurs
-            for img_obj in images_to_splice_orig:
-                img_obj.close()
-        
-        # Add watermark if enabled
-        if self.watermark_var.get():
-            images_with_watermark = []
-            font = None
-            font_size = 20
+            result_queue.put(("done", None))
+
+    def _cancel_preview_refinement(self):
+        if self._splice_cancel_event is not None:
+            self._splice_cancel_event.set()
+            self._splice_cancel_event = None
+            if self._watch_ready and self._watch_debounce_job is None:
+                self._schedule_watch_flush() # Arrivals were waiting for the cancelled job
+
+    def _build_layout_placeholder(self, layout, sizes, canvas_width, canvas_height):
+        """Draws grey boxes where each image will go, scaled to fit the preview canvas.
+
+        Returns the placeholder image and the scaled (x, y, w, h) box of every image.
+        """
+        (total_width, total_height), positions = layout
+        scale = min(canvas_width / total_width, canvas_height / total_height, 1.0)
+        coarse_size = (max(1, int(total_width * scale)), max(1, int(total_height * scale)))
+
+        coarse_image = Image.new('RGBA', coarse_size, (0, 0, 0, 0))
+        draw = ImageDraw.Draw(coarse_image)
+        boxes = []
+        for (x, y), (w, h) in zip(positions, sizes):
+            box = (int(x * scale), int(y * scale), max(1, int(w * scale)), max(1, int(h * scale)))
+            boxes.append(box)
+            draw.rectangle((box[0], box[1], box[0] + box[2] - 1, box[1] + box[3] - 1),
+                           fill=(210, 210, 210, 255), outline=(160, 160, 160, 255))
+        return coarse_image, boxes
+
+    def _decode_reduced(self, path, size):
+        """Decodes an image straight to roughly `size` and returns it as RGBA.
+
+        For JPEG, draft() lets the decoder skip most of the work (DCT scaling),
+        so even very large photos decode in a few milliseconds. Returns None when
+        no reduced decode is possible (other formats, or no useful JPEG scale),
+        since a full decode here would only be repeated by the final composite.
+        """
+        with Image.open(path) as img:
+            original_size = img.size
+            if img.draft(None, size) is None or img.size == original_size:
+                return None
+            if img.mode in ('P', '1'):
+                img = img.convert('RGBA') # Palette transparency does not survive resizing
+            tile = img.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+        return self._prepare_image_for_paste(tile)
+
+    def _refine_preview_worker(self, paths, mode, watermark_color, coarse_image, boxes, splice_state,
+                               canvas_width, canvas_height, cancel_event, result_queue):
+        """Runs off the Tk thread. Results are handed back through result_queue."""
+        last_push = time.monotonic()
+        deferred = set() # Images without a cheap reduced decode, filled in during stage 2
+
+        def paste_tile(index, tile):
+            nonlocal last_push
+            x, y = boxes[index][:2]
+            coarse_image.paste(tile, (x, y), tile)
+            if time.monotonic() - last_push >= self.COARSE_PREVIEW_PUSH_INTERVAL:
+                result_queue.put(("coarse", coarse_image.copy()))
+                last_push = time.monotonic()
+
+        # Stage 1: coarse preview from tiny decodes, pushed progressively
+        for index, p in enumerate(paths):
+            if cancel_event.is_set():
+                return
             try:
-                # Try to load a common font, adjust path if necessary or use default
-                # For simplicity, let's try a very basic font loading.
-                # A more robust solution would bundle a font or use a font finding mechanism.
-                font_path_msyh = "msyh.ttf" # Assuming "微软雅黑.ttf" is named this and in the same directory
-                font_path_simsun = "simsun.ttc" #宋体, common on Windows
-                font_path_arial = "arial.ttf"
-                font_path_dejavu = "DejaVuSans.ttf"
-
-                font_load_attempts = [font_path_msyh, font_path_simsun, font_path_arial, font_path_dejavu]
-                
-                for font_path_attempt in font_load_attempts:
-                    try:
-                        font = ImageFont.truetype(font_path_attempt, font_size)
-                        break # Font loaded successfully
-                    except IOError:
-                        font = None # Continue to next attempt
-                
-                if not font:
-                    font = ImageFont.load_default() # Fallback to Pillow's default bitmap font
-                    # Default font is small, consider adjusting text_position or font_size if this is often hit
-                    # For now, we'll use it as is.
-            except Exception as e:
-                # print(f"General font loading error: {e}")
-                font = ImageFont.load_default() # Ultimate fallback
+                tile = self._decode_reduced(p, boxes[index][2:])
+            except Exception:
+                continue # Keep the placeholder box for this image
+            if tile is None:
+                deferred.add(index)
+            else:
+                paste_tile(index, tile)
+        result_queue.put(("coarse", coarse_image.copy()))
+
+        def fill_deferred_tile(index, image):
+            if index in deferred:
+                paste_tile(index, image.resize(boxes[index][2:], Image.Resampling.BILINEAR, reducing_gap=2.0))
+
+        # Stage 2: full-resolution composite, shrunk to canvas resolution for display
+        try:
+            images_to_splice = self._load_images_for_splice(paths, cancel_event, on_loaded=fill_deferred_tile)
+            if images_to_splice is None:
+                return
+            if deferred:
+                result_queue.put(("coarse", coarse_image.copy()))
 
-            for i, img_rgba in enumerate(images_to_splice):
-                img_copy = img_rgba.copy() # Work on a copy
-                draw = ImageDraw.Draw(img_copy)
-                text = f"图{i+1}"
-                
-                text_position = (10, 10)
-                selected_text_color_name = self.watermark_color_var.get()
-                
-                if selected_text_color_name == "白色":
-                    text_color = (255, 255, 255, 255) # White
-                    shadow_color = (0, 0, 0, 128)     # Black shadow
-                elif selected_text_color_name == "黑色":
-                    text_color = (0, 0, 0, 255)       # Black
-                    shadow_color = (255, 255, 255, 128) # White shadow
-                else: # Default to Red
-                    text_color = (255, 0, 0, 255)     # Red
-                    shadow_color = (0, 0, 0, 128)     # Black shadow
-
-                shadow_offset = 1
-                # Draw shadow first
-                draw.text((text_position[0]+shadow_offset, text_position[1]+shadow_offset), text, font=font, fill=shadow_color)
-                # Draw main text
-                draw.text(text_position, text, font=font, fill=text_color)
-                
-                images_with_watermark.append(img_copy)
-            images_to_splice = images_with_watermark # Replace with watermarked images
+            if watermark_color is not None:
+                images_to_splice = self._apply_watermarks(images_to_splice, watermark_color)
+            if cancel_event.is_set():
+                return
 
-        mode = self.splice_mode_var.get()
-        output_image = None
+            if mode == "横向拼接":
+                output_image = self.splice_horizontal(images_to_splice)
+            elif mode == "纵向拼接":
+                output_image = self.splice_vertical(images_to_splice)
+            else: # "2xN网格"
+                output_image = self.splice_grid_2xn(images_to_splice)
+        except ImageLoadError as e:
+            result_queue.put(("load_error", (f"打开或预处理图片失败: {e}", e.path)))
+            return
+        except Exception as e:
+            result_queue.put(("error", f"打开或预处理图片失败: {e}"))
+            return
 
+        if output_image is None or cancel_event.is_set():
+            return
+        preview_image = self._fit_image_to_canvas(output_image, canvas_width, canvas_height)
+        result_queue.put(("final", (output_image, preview_image, splice_state)))
+
+    def _extend_splice_worker(self, old_state, new_paths, splice_state,
+                              canvas_width, canvas_height, cancel_event, result_queue):
+        """Appends new images to an existing composite whose earlier placements are unchanged.
+
+        Only the new images are decoded; the old composite is copied over as a whole.
+        """
+        base_image = old_state["image"]
+        n_old = len(splice_state["paths"]) - len(new_paths)
+        (total_width, total_height) = splice_state["size"]
+        try:
+            images_to_append = self._load_images_for_splice(new_paths, cancel_event)
+            if images_to_append is None:
+                return
+
+            watermark_color = splice_state["watermark_color"]
+            if watermark_color is not None:
+                images_to_append = self._apply_watermarks(images_to_append, watermark_color, start_index=n_old + 1)
+            if cancel_event.is_set():
+                return
+
+            output_image = Image.new('RGBA', (total_width, total_height), (0, 0, 0, 0))
+            output_image.paste(base_image, (0, 0))
+            for im, pos in zip(images_to_append, splice_state["positions"][n_old:]):
+                # Paste with alpha compositing
+                output_image.paste(im, pos, im if im.mode == 'RGBA' else None)
+        except ImageLoadError as e:
+            result_queue.put(("load_error", (f"打开或预处理图片失败: {e}", e.path)))
+            return
+        except Exception as e:
+            result_queue.put(("error", f"打开或预处理图片失败: {e}"))
+            return
+
+        if cancel_event.is_set():
+            return
+        preview_image = self._extend_preview(old_state, splice_state, images_to_append,
+                                             canvas_width, canvas_height)
+        if preview_image is None:
+            preview_image = self._fit_image_to_canvas(output_image, canvas_width, canvas_height)
+        result_queue.put(("final", (output_image, preview_image, splice_state)))
+
+    def _extend_preview(self, old_state, splice_state, new_images, canvas_width, canvas_height):
+        """Builds the preview of an extended composite from the previous preview plus the new images.
+
+        Only the new images are resampled from full resolution. The old part comes from the
+        previous (canvas-sized) preview, rescaled if the sheet grew enough to change the
+        scale, so the cost of an append no longer grows with the whole sheet.
+        Returns None when the previous preview cannot be reused.
+        """
+        old_preview = old_state.get("preview")
+        if old_preview is None:
+            return None
+        old_width, old_height = old_state["size"]
+        new_width, new_height = splice_state["size"]
+        old_ratio = min(canvas_width / old_width, canvas_height / old_height)
+        new_ratio = min(canvas_width / new_width, canvas_height / new_height)
+        if old_ratio >= 1 or new_ratio >= 1:
+            return None # Not shrunk, the regular path is cheap anyway
+        if old_preview.size != (int(old_width * old_ratio), int(old_height * old_ratio)):
+            return None # The canvas was resized since the previous preview
+        preview_size = (int(new_width * new_ratio), int(new_height * new_ratio))
+        if preview_size[0] == 0 or preview_size[1] == 0:
+            return None
+
+        preview_image = Image.new('RGBA', preview_size, (0, 0, 0, 0))
+        if new_ratio == old_ratio:
+            old_part = old_preview
+        else:
+            old_part = old_preview.resize((max(1, int(old_width * new_ratio)), max(1, int(old_height * new_ratio))),
+                                          Image.Resampling.LANCZOS)
+        preview_image.paste(old_part, (0, 0))
+
+        n_old = len(old_state["paths"])
+        for im, (x, y) in zip(new_images, splice_state["positions"][n_old:]):
+            tile = im.resize((max(1, round(im.width * new_ratio)), max(1, round(im.height * new_ratio))),
+                             Image.Resampling.LANCZOS, reducing_gap=3.0)
+            preview_image.paste(tile, (int(x * new_ratio), int(y * new_ratio)), tile)
+        return preview_image
+
+    def _poll_splice_results(self, cancel_event, result_queue):
+        if cancel_event.is_set():
+            return # Superseded by a list/mode change or a new splice
+
+        finished = False
+        try:
+            while True:
+                kind, payload = result_queue.get_nowait()
+                if kind == "coarse":
+                    self._draw_preview(payload)
+                elif kind == "final":
+                    output_image, preview_image, splice_state = payload
+                    # Keep the composite and its preview with the layout so appends can reuse both
+                    self._splice_state = dict(splice_state, image=output_image, preview=preview_image)
+                    self.update_preview(output_image, preview_image)
+                    finished = True
+                elif kind == "error":
+                    messagebox.showerror("错误", payload)
+                    finished = True
+                elif kind == "load_error":
+                    message, path = payload
+                    finished = True
+                    self._handle_image_load_error(message, path)
+                elif kind == "done":
+                    finished = True
+        except queue.Empty:
+            pass
+
+        if finished:
+            if self._splice_cancel_event is cancel_event:
+                self._splice_cancel_event = None
+            if self._watch_ready and self._watch_debounce_job is None:
+                self._flush_watch_arrivals() # Arrivals queued while this job was running
+        else:
+            self.root.after(self.PREVIEW_POLL_INTERVAL_MS, self._poll_splice_results, cancel_event, result_queue)
+
+    def _compute_layout(self, mode, sizes):
+        """Returns ((total_width, total_height), [(x, y), ...]) for the given image sizes."""
         if mode == "横向拼接":
-            output_image = self.splice_horizontal(images_to_splice)
+            return self._layout_horizontal(sizes)
         elif mode == "纵向拼接":
-            output_image = self.splice_vertical(images_to_splice)
+            return self._layout_vertical(sizes)
         elif mode == "2xN网格":
-            if len(images_to_splice) < 1: # Allow even 1 image for 2xN, it will be a 1x1 grid
-                messagebox.showwarning("提示", "2xN网格拼接至少需要1张图片。")
-                return
-            output_image = self.splice_grid_2xn(images_to_splice)
-        else:
-            messagebox.showerror("错误", "未知的拼接模式。")
-            # No need to close images_to_splice here, they are copies or converted versions
-            return
+            return self._layout_grid_2xn(sizes)
+        return None
 
-        if output_image:
-            self.update_preview(output_image)
-        
-        # images_to_splice are modified copies or results of conversion, Pillow handles their memory.
-        # Original images (images_to_splice_orig) are closed in the finally block.
+    def _layout_horizontal(self, sizes):
+        widths, heights = zip(*sizes)
+        total_width = sum(widths)
+        max_height = max(heights)
+
+        positions = []
+        x_offset = 0
+        for w, h in sizes:
+            positions.append((x_offset, (max_height - h) // 2))
+            x_offset += w
+        return (total_width, max_height), positions
+
+    def _layout_vertical(self, sizes):
+        widths, heights = zip(*sizes)
+        max_width = max(widths)
+        total_height = sum(heights)
+
+        positions = []
+        y_offset = 0
+        for w, h in sizes:
+            positions.append(((max_width - w) // 2, y_offset))
+            y_offset += h
+        return (max_width, total_height), positions
+
+    def _layout_grid_2xn(self, sizes): # Compact "flow" layout, two images per row
+        positions = []
+        current_y_offset = 0
+        max_overall_width = 0
+
+        for row_start in range(0, len(sizes), 2):
+            row_sizes = sizes[row_start:row_start + 2]
+            current_x = 0
+            for w, h in row_sizes:
+                # Vertical alignment within a row: align to the top of the row.
+                positions.append((current_x, current_y_offset))
+                current_x += w
+            max_overall_width = max(max_overall_width, current_x)
+            current_y_offset += max(h for w, h in row_sizes)
+
+        return (max_overall_width, current_y_offset), positions
 
     def splice_horizontal(self, images):
         if not images: return None
-        widths, heights = zip(*(i.size for i in images))
-        total_width = sum(widths)
-        max_height = max(heights)
-        
+        (total_width, max_height), positions = self._layout_horizontal([i.size for i in images])
+
         # Create an RGBA canvas with a transparent background
         new_im = Image.new('RGBA', (total_width, max_height), (0, 0, 0, 0))
-        
-        x_offset = 0
-        for im in images: # im should be RGBA here
+
+        for im, pos in zip(images, positions): # im should be RGBA here
             # Paste with alpha compositing
-            new_im.paste(im, (x_offset, (max_height - im.height) // 2), im if im.mode == 'RGBA' else None)
-            x_offset += im.width
+            new_im.paste(im, pos, im if im.mode == 'RGBA' else None)
         return new_im
 
     def splice_vertical(self, images):
         if not images: return None
-        widths, heights = zip(*(i.size for i in images))
-        max_width = max(widths)
-        total_height = sum(heights)
+        (max_width, total_height), positions = self._layout_vertical([i.size for i in images])
 
         # Create an RGBA canvas with a transparent background
         new_im = Image.new('RGBA', (max_width, total_height), (0, 0, 0, 0))
 
-        y_offset = 0
-        for im in images: # im should be RGBA here
-            x_pos = (max_width - im.width) // 2
+        for im, pos in zip(images, positions): # im should be RGBA here
             # Paste with alpha compositing
-            new_im.paste(im, (x_pos, y_offset), im if im.mode == 'RGBA' else None)
-            y_offset += im.height
+            new_im.paste(im, pos, im if im.mode == 'RGBA' else None)
         return new_im
 
     def splice_grid_2xn(self, images): # Compact "flow" layout
         if not images: return None
-        num_images = len(images)
-        cols = 2
-        if num_images == 1:
+        if len(images) == 1:
             return images[0] # Single image, just return it
 
-        # Calculate row structure and dimensions
-        row_info = [] # Stores (actual_row_width, max_row_height, [images_in_row])
-        
-        current_y_offset = 0
-        max_overall_width = 0
-        
-        i = 0
-        while i < num_images:
-            images_in_current_row = []
-            current_row_width = 0
-            current_row_max_height = 0
-
-            # First image in the row
-            img1 = images[i]
-            images_in_current_row.append(img1)
-            current_row_width += img1.width
-            current_row_max_height = max(current_row_max_height, img1.height)
-            i += 1
-
-            # Second image in the row, if available
-            if i < num_images:
-                img2 = images[i]
-                images_in_current_row.append(img2)
-                current_row_width += img2.width # Images are side-by-side
-                current_row_max_height = max(current_row_max_height, img2.height)
-                i += 1
-            
-            row_info.append({
-                "width": current_row_width,
-                "height": current_row_max_height,
-                "images": images_in_current_row,
-                "y_start": current_y_offset
-            })
-            max_overall_width = max(max_overall_width, current_row_width)
-            current_y_offset += current_row_max_height
-
-        if max_overall_width == 0 or current_y_offset == 0: # Should not happen if images exist
+        (max_overall_width, total_height), positions = self._layout_grid_2xn([i.size for i in images])
+        if max_overall_width == 0 or total_height == 0: # Should not happen if images exist
             return None
 
         # Create the new image canvas with a transparent background
-        total_height = current_y_offset
         new_im = Image.new('RGBA', (max_overall_width, total_height), (0, 0, 0, 0))
 
-        # Paste images
-        for row_data in row_info:
-            current_x = 0
-            y_pos = row_data["y_start"]
-            for img_idx, im in enumerate(row_data["images"]): # im should be RGBA here
-                # For this compact layout, images are simply placed one after another.
-                # Vertical alignment within a row: align to the top of the row.
-                # Paste with alpha compositing
-                new_im.paste(im, (current_x, y_pos), im if im.mode == 'RGBA' else None)
-                current_x += im.width
-        
+        for im, pos in zip(images, positions): # im should be RGBA here
+            # Paste with alpha compositing
+            new_im.paste(im, pos, im if im.mode == 'RGBA' else None)
+
         return new_im
 
+    def export_atlas(self):
+        if not self.image_paths:
+            messagebox.showwarning("提示", "请先添加图片。")
+            return
+
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".png",
+            filetypes=(("PNG 文件", "*.png"), ("所有文件", "*.*")),
+            title="导出图集 (同时生成同名 .json)"
+        )
+        if not file_path:
+            return
+
+        options = {
+            "max_size": int(self.atlas_max_size_var.get()),
+            "power_of_two": self.atlas_pot_var.get(),
+            "trim": self.atlas_trim_var.get(),
+            "dedup": self.atlas_dedup_var.get(),
+        }
+        canvas_width, canvas_height = self._get_preview_canvas_size()
+        if self._atlas_cancel_event is not None:
+            self._atlas_cancel_event.set() # A new export replaces one still in progress
+        cancel_event = threading.Event()
+        result_queue = queue.Queue()
+        self._atlas_cancel_event = cancel_event
+
+        worker = threading.Thread(
+            target=self._run_worker,
+            args=(result_queue, self._export_atlas_worker,
+                  list(self.image_paths), file_path, options,
+                  canvas_width, canvas_height, cancel_event, result_queue),
+            daemon=True
+        )
+        worker.start()
+        self.root.after(self.PREVIEW_POLL_INTERVAL_MS, self._poll_atlas_results,
+                        cancel_event, result_queue, self._splice_generation)
+
+    def _export_atlas_worker(self, paths, file_path, options,
+                             canvas_width, canvas_height, cancel_event, result_queue):
+        """Runs off the Tk thread: builds the atlas pages and writes them with the JSON sidecar."""
+        try:
+            atlas = self._build_atlas(paths, cancel_event=cancel_event, **options)
+            if atlas is None or cancel_event.is_set():
+                result_queue.put(("aborted", None))
+                return
+            # Past this point the files are written, so the export always reports success
+            pages, metadata = atlas
+            json_path = self._write_atlas(pages, metadata, file_path)
+        except Exception as e:
+            result_queue.put(("error", f"导出图集失败: {e}"))
+            return
+
+        summary = (f"图集已导出: {len(pages)} 页, {len(metadata['frames'])} 张图片"
+                   f" ({metadata['meta']['unique_sprites']} 张不重复)。\n元数据: {json_path}")
+        preview_image = self._fit_image_to_canvas(pages[0], canvas_width, canvas_height)
+        result_queue.put(("atlas", (pages[0], preview_image, summary)))
+
+    def _poll_atlas_results(self, cancel_event, result_queue, splice_generation):
+        """Like _poll_splice_results, but keeps polling after a cancel.
+
+        That way the user always learns whether the export finished, failed or was aborted.
+        The first page only replaces the current result if no splice started after the
+        export began (splice_generation is the value at that time).
+        """
+        finished = False
+        try:
+            while True:
+                kind, payload = result_queue.get_nowait()
+                if kind == "atlas":
+                    first_page, preview_image, summary = payload
+                    if (self._atlas_cancel_event is cancel_event # Not superseded by a newer export
+                            and self._splice_generation == splice_generation):
+                        # _splice_state keeps its own composite, so watch mode can still extend it
+                        self.update_preview(first_page, preview_image)
+                    finished = True
+                    messagebox.showinfo("成功", summary)
+                elif kind == "aborted":
+                    finished = True
+                    messagebox.showwarning("提示", "图集导出已被新的导出取消，未写入任何文件。")
+                elif kind == "error":
+                    finished = True
+                    messagebox.showerror("错误", payload)
+                elif kind == "done":
+                    finished = True
+        except queue.Empty:
+            pass
+
+        if finished:
+            if self._atlas_cancel_event is cancel_event:
+                self._atlas_cancel_event = None
+        else:
+            self.root.after(self.PREVIEW_POLL_INTERVAL_MS, self._poll_atlas_results,
+                            cancel_event, result_queue, splice_generation)
+
+    def _build_atlas(self, paths, max_size, power_of_two=False, trim=True, dedup=True, cancel_event=None):
+        """Packs the images into one or more RGBA pages of at most max_size*max_size.
+
+        Returns (pages, metadata), or None if cancelled. Frames in the metadata keep the
+        order of paths; duplicates (identical pixels after trimming) share one rectangle.
+        """
+        padding = self.ATLAS_PADDING
+        sprites = []       # Unique RGBA sprite images
+        sprite_by_key = {} # (size, digest) -> index into sprites
+        frames = []
+
+        for p in paths:
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            with Image.open(p) as img_orig:
+                im = self._prepare_image_for_paste(img_orig)
+            source_w, source_h = im.size
+            bbox = (0, 0, source_w, source_h)
+            if trim:
+                bbox = im.getchannel('A').getbbox() or (0, 0, 1, 1) # Keep one pixel of a fully transparent image
+                if bbox != (0, 0, source_w, source_h):
+                    im = im.crop(bbox)
+
+            if im.width > max_size or im.height > max_size:
+                raise ValueError(f"{os.path.basename(p)} ({im.width}x{im.height}) 超过图集最大尺寸 {max_size}")
+
+            key = (im.size, hashlib.sha1(im.tobytes()).digest()) if dedup else len(sprites)
+            sprite_index = sprite_by_key.get(key)
+            if sprite_index is None:
+                sprite_index = len(sprites)
+                sprites.append(im)
+                sprite_by_key[key] = sprite_index
+
+            frames.append({
+                "filename": os.path.basename(p),
+                "sprite": sprite_index,
+                "trimmed": bbox != (0, 0, source_w, source_h),
+                "spriteSourceSize": {"x": bbox[0], "y": bbox[1], "w": im.width, "h": im.height},
+                "sourceSize": {"w": source_w, "h": source_h},
+            })
+
+        # Tallest first packs tightest for skyline; padding is added to the right/bottom of each
+        # sprite and to the page, so sprites never touch but can still reach the page edge.
+        order = sorted(range(len(sprites)), key=lambda i: (sprites[i].height, sprites[i].width), reverse=True)
+        packers = []
+        placements = [None] * len(sprites) # (page, x, y)
+        for i in order:
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            w, h = sprites[i].width + padding, sprites[i].height + padding
+            for page_index, packer in enumerate(packers):
+                pos = packer.insert(w, h)
+                if pos is not None:
+                    break
+            else:
+                packers.append(SkylinePacker(max_size + padding, max_size + padding))
+                page_index = len(packers) - 1
+                pos = packers[-1].insert(w, h)
+            placements[i] = (page_index, pos[0], pos[1])
+
+        # Each page is cropped to what it actually uses (rounded up to a power of two if requested)
+        page_sizes = [[1, 1] for _ in packers]
+        for im, (page_index, x, y) in zip(sprites, placements):
+            page_sizes[page_index][0] = max(page_sizes[page_index][0], x + im.width)
+            page_sizes[page_index][1] = max(page_sizes[page_index][1], y + im.height)
+        if power_of_two:
+            page_sizes = [[1 << (w - 1).bit_length(), 1 << (h - 1).bit_length()] for w, h in page_sizes]
+
+        pages = [Image.new('RGBA', tuple(size), (0, 0, 0, 0)) for size in page_sizes]
+        for im, (page_index, x, y) in zip(sprites, placements):
+            pages[page_index].paste(im, (x, y)) # Copy pixels as-is, alpha included
+
+        for frame in frames:
+            page_index, x, y = placements[frame.pop("sprite")]
+            size = frame["spriteSourceSize"]
+            frame["page"] = page_index
+            frame["frame"] = {"x": x, "y": y, "w": size["w"], "h": size["h"]}
+
+        metadata = {
+            "frames": frames,
+            "meta": {
+                "pages": [{"size": {"w": w, "h": h}} for w, h in page_sizes],
+                "padding": padding,
+                "unique_sprites": len(sprites),
+            },
+        }
+        return pages, metadata
+
+    def _write_atlas(self, pages, metadata, file_path):
+        """Saves the pages as PNG (name.png, or name_0.png, name_1.png, ...) plus name.json."""
+        base, _ = os.path.splitext(file_path)
+        if len(pages) == 1:
+            page_paths = [base + ".png"]
+        else:
+            page_paths = [f"{base}_{i}.png" for i in range(len(pages))]
+
+        for page, page_path, page_meta in zip(pages, page_paths, metadata["meta"]["pages"]):
+            page.save(page_path)
+            page_meta["image"] = os.path.basename(page_path)
+
+        json_path = base + ".json"
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        return json_path
+
     def save_image(self):
         if not self.processed_image: # self.processed_image should now be RGBA
             messagebox.showwarning("提示", "没有可保存的图片。")